@@ -10,7 +10,16 @@ License: MIT
 
 import os
 import re
+import sys
+import stat
+import json
+import atexit
+import hashlib
+import tempfile
 import argparse
+import threading
+import concurrent.futures
+from dataclasses import dataclass, field
 from pathlib import Path
 from shutil import copyfile
 from difflib import unified_diff
@@ -18,21 +27,7 @@ from difflib import unified_diff
 try:
     from colorama import Fore, Style, init
     init(autoreset=True)
-    USE_COLOR = True
-except ImportError:
-    USE_COLOR = False
-
-INCLUDE_PATTERN = re.compile(r'#include\s+"@/(.+?)"')
-DEFAULT_EXTENSIONS = ('.c', '.h', '.cpp', '.hpp', '.cc', '.cxx')
-
-MISSING_INCLUDES = []
-
-def log(msg, level="info", verbose=False):
-    if not USE_COLOR:
-        if level != "debug" or verbose:
-            print(msg)
-        return
-    colors = {
+    _LEVEL_PREFIX = {
         "info": Fore.CYAN,
         "warn": Fore.YELLOW,
         "error": Fore.RED,
@@ -40,24 +35,108 @@ def log(msg, level="info", verbose=False):
         "update": Fore.MAGENTA,
         "debug": Fore.LIGHTBLACK_EX,
     }
-    if level != "debug" or verbose:
-        print(colors.get(level, Fore.WHITE) + msg + Style.RESET_ALL)
+    _DEFAULT_PREFIX = Fore.WHITE
+    _RESET = Style.RESET_ALL
+except ImportError:
+    _LEVEL_PREFIX = {}
+    _DEFAULT_PREFIX = ""
+    _RESET = ""
+
+try:
+    import re2 as re_engine
+except ImportError:
+    re_engine = re
+
+INCLUDE_PATTERN = re_engine.compile(rb'(#include[ \t]+")@/([^"\n]+)"')
+DEFAULT_EXTENSIONS = ('.c', '.h', '.cpp', '.hpp', '.cc', '.cxx')
+CACHE_FILENAME = ".c-importpath-fixer-cache.json"
+READ_BUFFER_SIZE = 1 << 18
+
+_OUTPUT_LOCK = threading.Lock()
+_READ_BUFFERS = threading.local()
+_LOG_BUFFER = threading.local()
+
+@dataclass
+class RunContext:
+    project_root: Path
+    project_root_str: str = field(init=False)
+    missing: list = field(default_factory=list)
+    cache: dict = field(default_factory=dict)
+    resolved: dict = field(default_factory=dict)
+    known_files: set = field(default_factory=set)
+    dir_caches: dict = field(default_factory=dict)
+    backup_dir_entries: dict = field(default_factory=dict)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def __post_init__(self):
+        self.project_root_str = str(self.project_root)
+
+def _emit(text):
+    pending = getattr(_LOG_BUFFER, "lines", None)
+    if pending is not None:
+        pending.append(text)
+        return
+    with _OUTPUT_LOCK:
+        sys.stdout.write(text)
+
+def flush_log():
+    pending = getattr(_LOG_BUFFER, "lines", None)
+    if pending:
+        with _OUTPUT_LOCK:
+            sys.stdout.write("".join(pending))
+        pending.clear()
+
+def log(msg, level="info", verbose=False):
+    if level == "debug" and not verbose:
+        return
+    _emit(f"{_LEVEL_PREFIX.get(level, _DEFAULT_PREFIX)}{msg}{_RESET}\n")
+
+def _scandir_recursive(path, extensions, exclude_set):
+    try:
+        it = os.scandir(path)
+    except OSError:
+        return
+    with it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False):
+                if entry.path in exclude_set:
+                    continue
+                yield from _scandir_recursive(entry.path, extensions, exclude_set)
+            elif entry.name.endswith(extensions) and entry.is_file():
+                yield Path(entry.path)
+
+def _unique_files(files):
+    unique = {}
+    for f in files:
+        try:
+            st = os.stat(f)
+        except OSError:
+            continue
+        key = (st.st_dev, st.st_ino)
+        kept = unique.get(key)
+        if kept is None or (kept.is_symlink() and not f.is_symlink()):
+            unique[key] = f
+    return list(unique.values())
 
 def find_source_files(root_dir: Path, extensions, exclude_dirs):
-    exclude_dirs = [root_dir / Path(p).resolve().relative_to(root_dir) for p in exclude_dirs]
-    source_files = []
-    for f in root_dir.rglob("*"):
-        if f.is_file() and f.suffix in extensions:
-            if any(excluded in f.parents for excluded in exclude_dirs):
-                continue
-            source_files.append(f)
-    return source_files
-
-def compute_relative_include(current_file: Path, include_path: str, project_root: Path):
-    absolute_path = (project_root / include_path).resolve()
-    if not absolute_path.exists():
+    exclude_set = {str((root_dir / p).resolve()) for p in exclude_dirs}
+    return _unique_files(_scandir_recursive(str(root_dir), tuple(extensions), exclude_set))
+
+def _resolve_include(ctx: RunContext, include_path: str):
+    absolute_path = os.path.normpath(os.path.join(ctx.project_root_str, include_path))
+    if absolute_path not in ctx.known_files and not os.path.exists(absolute_path):
+        return None
+    return absolute_path
+
+def compute_relative_include(current_file: Path, include_path: str, ctx: RunContext):
+    try:
+        absolute_path = ctx.resolved[include_path]
+    except KeyError:
+        absolute_path = ctx.resolved[include_path] = _resolve_include(ctx, include_path)
+    if absolute_path is None:
         log(f"[MISSING] {include_path} in {current_file}", "error")
-        MISSING_INCLUDES.append((current_file, include_path))
+        with ctx.lock:
+            ctx.missing.append((str(current_file), include_path))
         return None
     try:
         return os.path.relpath(absolute_path, start=current_file.parent)
@@ -65,68 +144,243 @@ def compute_relative_include(current_file: Path, include_path: str, project_root
         log(f"[ERROR] Failed to compute relative path for {include_path} in {current_file}", "error")
         return None
 
-def next_backup_filename(original: Path):
-    i = 1
-    while True:
-        bak = original.with_suffix(original.suffix + f".bak{i}")
-        if not bak.exists():
-            return bak
-        i += 1
+def next_backup_filename(original: Path, ctx: RunContext):
+    with ctx.lock:
+        entries = ctx.backup_dir_entries.get(original.parent)
+        if entries is None:
+            entries = ctx.backup_dir_entries[original.parent] = set(os.listdir(original.parent))
+        i = 1
+        while True:
+            bak = original.with_suffix(original.suffix + f".bak{i}")
+            if bak.name not in entries:
+                entries.add(bak.name)
+                return bak
+            i += 1
 
-def process_file(file_path: Path, project_root: Path, dry_run=False, force=False, make_backup=True, verbose=False, check_only=False, show_diff=False):
+def _can_backup_by_rename(file_path: Path):
     try:
-        lines = file_path.read_text(encoding='utf-8').splitlines(keepends=True)
+        st = os.lstat(file_path)
+    except OSError:
+        return False
+    if not stat.S_ISREG(st.st_mode) or st.st_nlink != 1:
+        return False
+    if hasattr(os, "geteuid"):
+        return st.st_uid == os.geteuid() and st.st_gid == os.getegid()
+    return True
+
+def _valid_cache_entry(entry):
+    return (
+        isinstance(entry, list)
+        and 2 <= len(entry) <= 3
+        and all(type(v) is int for v in entry[:2])
+        and (len(entry) == 2 or isinstance(entry[2], str))
+    )
+
+def load_cache(ctx: RunContext, cache_path: Path):
+    try:
+        with open(cache_path, encoding='utf-8') as fp:
+            data = json.load(fp)
+    except FileNotFoundError:
+        return
+    except (OSError, ValueError) as e:
+        log(f"[WARN] Ignoring unreadable cache: {cache_path} ({e})", "warn")
+        return
+    if not isinstance(data, dict):
+        log(f"[WARN] Ignoring malformed cache: {cache_path}", "warn")
+        return
+    entries = {path: entry for path, entry in data.items() if _valid_cache_entry(entry)}
+    if len(entries) != len(data):
+        log(f"[WARN] Ignoring {len(data) - len(entries)} malformed entries in cache: {cache_path}", "warn")
+    ctx.cache.update(entries)
+
+def save_cache(ctx: RunContext, cache_path: Path):
+    tmp_path = None
+    try:
+        fd, tmp_path = tempfile.mkstemp(prefix=cache_path.name + ".", dir=cache_path.parent)
+        with open(fd, "w", encoding='utf-8') as fp:
+            json.dump(ctx.cache, fp)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        log(f"[WARN] Could not write cache: {cache_path} ({e})", "warn")
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+def _stat_key(st):
+    return [st.st_mtime_ns, st.st_size]
+
+def _content_digest(data):
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+def _is_cached(ctx: RunContext, file_path: Path, st):
+    entry = ctx.cache.get(str(file_path))
+    return entry is not None and entry[:2] == _stat_key(st)
+
+def _cached_digest(ctx: RunContext, file_path: Path):
+    entry = ctx.cache.get(str(file_path))
+    return entry[2] if entry is not None and len(entry) > 2 else None
+
+def _remember(ctx: RunContext, file_path: Path, st, digest=None):
+    key = _stat_key(st)
+    if digest is not None:
+        key.append(digest)
+    with ctx.lock:
+        ctx.cache[str(file_path)] = key
+
+def _read_buffer():
+    buf = getattr(_READ_BUFFERS, "buf", None)
+    if buf is None:
+        buf = _READ_BUFFERS.buf = bytearray(READ_BUFFER_SIZE)
+    return buf
+
+def _read_bytes(path: Path):
+    fd = os.open(path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        st = os.fstat(fd)
+        if hasattr(os, "readv") and st.st_size < READ_BUFFER_SIZE:
+            buf = _read_buffer()
+            view = memoryview(buf)
+            size = 0
+            while size < READ_BUFFER_SIZE:
+                n = os.readv(fd, [view[size:]])
+                if not n:
+                    return buf, size, st
+                size += n
+            # The file grew past the buffer while we were reading it.
+            os.lseek(fd, 0, os.SEEK_SET)
+        chunks = []
+        remaining = st.st_size
+        while True:
+            chunk = os.read(fd, max(remaining, 1 << 16))
+            if not chunk:
+                break
+            chunks.append(chunk)
+            remaining -= len(chunk)
+    finally:
+        os.close(fd)
+    data = b"".join(chunks)
+    return data, len(data), st
+
+def _write_bytes(path: Path, data: bytes, mode=None):
+    flags = os.O_WRONLY | getattr(os, "O_BINARY", 0)
+    if mode is None:
+        fd = os.open(path, flags | os.O_CREAT | os.O_TRUNC, 0o644)
+    else:
+        fd = os.open(path, flags | os.O_CREAT | os.O_EXCL, mode)
+    try:
+        if mode is not None:
+            # A freshly created file: os.open's mode was filtered by the umask.
+            if hasattr(os, "fchmod"):
+                os.fchmod(fd, mode)
+            else:
+                os.chmod(path, mode)
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+        return os.fstat(fd)
+    finally:
+        os.close(fd)
+
+def process_file(file_path: Path, ctx: RunContext, dry_run=False, force=False, make_backup=True, verbose=False, check_only=False, show_diff=False, use_cache=False):
+    try:
+        if use_cache and not force and _is_cached(ctx, file_path, os.stat(file_path)):
+            log(f"[CACHED] {file_path}", "debug", verbose)
+            return False
+        raw, size, st = _read_bytes(file_path)
     except Exception as e:
         log(f"[ERROR] Could not read file: {file_path} ({e})", "error")
         return False
 
-    changed = False
-    updated_lines = []
-
-    for line in lines:
-        match = INCLUDE_PATTERN.search(line)
-        if match:
-            subpath = match.group(1)
-            rel_path = compute_relative_include(file_path, subpath, project_root)
-            if rel_path:
-                new_line = line.replace(f'"@/{subpath}"', f'"{rel_path}"')
-                if new_line != line:
-                    changed = True
-                    log(f"[DEBUG] Updating include in {file_path.name}: {line.strip()} → {new_line.strip()}", "debug", verbose)
-                    line = new_line
-        updated_lines.append(line)
+    if raw.find(b'"@/', 0, size) < 0 and not force:
+        if use_cache:
+            _remember(ctx, file_path, st)
+        log(f"[SKIPPED] {file_path}", "debug", verbose)
+        return False
+
+    if type(raw) is not bytes:
+        raw = bytes(memoryview(raw)[:size])
+
+    unresolved = 0
+    dir_cache = ctx.dir_caches.setdefault(file_path.parent, {})
+
+    def _repl(m):
+        nonlocal unresolved
+        subpath = m.group(2)
+        rel_path = dir_cache.get(subpath)
+        if rel_path is None:
+            rel_path = compute_relative_include(file_path, os.fsdecode(subpath), ctx)
+            if not rel_path:
+                unresolved += 1
+                return m.group(0)
+            rel_path = dir_cache[subpath] = os.fsencode(rel_path)
+        new_include = m.group(1) + rel_path + b'"'
+        if verbose:
+            log(f"[DEBUG] Updating include in {file_path.name}: {m.group(0).decode(errors='replace')} → {new_include.decode(errors='replace')}", "debug", verbose)
+        return new_include
+
+    new_raw = INCLUDE_PATTERN.sub(_repl, raw)
+    changed = new_raw != raw
 
     if check_only:
         return changed
 
+    if force and not changed and use_cache and _cached_digest(ctx, file_path) == _content_digest(raw):
+        log(f"[SKIPPED] {file_path} (unchanged since last write)", "debug", verbose)
+        return False
+
     if changed or force:
         if dry_run:
             log(f"[DRY-RUN] Would update: {file_path}", "update")
         else:
-            if make_backup:
-                backup_path = next_backup_filename(file_path)
-                copyfile(file_path, backup_path)
-                log(f"[BACKUP] Created: {backup_path}", "debug", verbose)
+            backup_path = None
+            renamed = False
             try:
-                if show_diff:
+                if make_backup:
+                    backup_path = next_backup_filename(file_path, ctx)
+                    if _can_backup_by_rename(file_path):
+                        os.rename(file_path, backup_path)
+                        renamed = True
+                    else:
+                        copyfile(file_path, backup_path)
+                    log(f"[BACKUP] Created: {backup_path}", "debug", verbose)
+                if show_diff and changed:
                     diff = unified_diff(
-                        [l.rstrip('\n') for l in lines],
-                        [l.rstrip('\n') for l in updated_lines],
+                        raw.decode(errors='replace').splitlines(),
+                        new_raw.decode(errors='replace').splitlines(),
                         fromfile=str(file_path),
                         tofile=str(file_path) + " (updated)",
+                        n=1,
                         lineterm=""
                     )
-                    print("\n".join(diff))
-                file_path.write_text("".join(updated_lines), encoding='utf-8')
+                    for line in diff:
+                        _emit(line + "\n")
+                new_st = _write_bytes(file_path, new_raw, stat.S_IMODE(st.st_mode) if renamed else None)
+                if use_cache and not unresolved:
+                    _remember(ctx, file_path, new_st, _content_digest(new_raw) if force else None)
                 log(f"[UPDATED] {file_path}", "success")
             except Exception as e:
                 log(f"[ERROR] Failed to write file: {file_path} ({e})", "error")
+                if renamed:
+                    try:
+                        os.replace(backup_path, file_path)
+                    except OSError as restore_error:
+                        log(f"[ERROR] Could not restore {file_path} from {backup_path} ({restore_error})", "error")
                 return False
         return True
     else:
+        if use_cache and not unresolved:
+            _remember(ctx, file_path, st)
         log(f"[SKIPPED] {file_path}", "debug", verbose)
         return False
 
+def _positive_int(value):
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: {value!r}")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be a positive integer: {value!r}")
+    return number
+
 def main():
     parser = argparse.ArgumentParser(description="Fix #include \"@/...\" paths in C/C++ files.")
     parser.add_argument("root", nargs="?", default=".", help="Project root directory")
@@ -138,6 +392,8 @@ def main():
     parser.add_argument("--verbose", action="store_true", help="Enable verbose debug output")
     parser.add_argument("--check-only", action="store_true", help="Only check for missing includes and possible changes")
     parser.add_argument("--show-diff", action="store_true", help="Show diff when changes are made")
+    parser.add_argument("--no-cache", action="store_true", help=f"Do not use the incremental cache ({CACHE_FILENAME} in the project root)")
+    parser.add_argument("--jobs", type=_positive_int, default=None, help="Number of files to process in parallel (default: 4 per CPU, max 32)")
 
     args = parser.parse_args()
     project_root = Path(args.root).resolve()
@@ -146,38 +402,57 @@ def main():
         log(f"[ERROR] Root directory does not exist: {project_root}", "error")
         return
 
-    extensions = set(DEFAULT_EXTENSIONS + tuple(f".{ext.lstrip('.')}" for ext in (args.ext or [])))
+    extensions = tuple(dict.fromkeys(DEFAULT_EXTENSIONS + tuple(f".{ext.lstrip('.')}" for ext in (args.ext or []))))
     exclude_dirs = args.exclude
 
+    ctx = RunContext(project_root)
+    use_cache = not args.no_cache
+    if use_cache:
+        cache_path = project_root / CACHE_FILENAME
+        load_cache(ctx, cache_path)
+        if not (args.dry_run or args.check_only):
+            atexit.register(save_cache, ctx, cache_path)
+
     log(f"[INFO] Scanning {project_root} for extensions {extensions}", "info")
     files = find_source_files(project_root, extensions, exclude_dirs)
+    ctx.known_files.update(str(f) for f in files)
 
     total = len(files)
     updated = 0
     skipped = 0
 
-    for f in files:
-        result = process_file(
-            f, project_root,
-            dry_run=args.dry_run,
-            force=args.force,
-            make_backup=not args.no_backup,
-            verbose=args.verbose,
-            check_only=args.check_only,
-            show_diff=args.show_diff
-        )
-        if result:
-            updated += 1
-        else:
-            skipped += 1
+    def _process(f):
+        _LOG_BUFFER.lines = []
+        try:
+            return process_file(
+                f, ctx,
+                dry_run=args.dry_run,
+                force=args.force,
+                make_backup=not args.no_backup,
+                verbose=args.verbose,
+                check_only=args.check_only,
+                show_diff=args.show_diff,
+                use_cache=use_cache
+            )
+        finally:
+            flush_log()
+            _LOG_BUFFER.lines = None
+
+    workers = args.jobs or min(32, (os.cpu_count() or 1) * 4)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        for result in executor.map(_process, files):
+            if result:
+                updated += 1
+            else:
+                skipped += 1
 
     log(f"\nSummary:", "info")
     log(f"  Total files scanned     : {total}", "info")
     log(f"  Files updated           : {updated}", "success")
     log(f"  Files skipped           : {skipped}", "warn")
-    log(f"  Missing include targets : {len(MISSING_INCLUDES)}", "error")
-    if MISSING_INCLUDES:
-        for file, include in MISSING_INCLUDES:
+    log(f"  Missing include targets : {len(ctx.missing)}", "error")
+    if ctx.missing:
+        for file, include in ctx.missing:
             log(f"    {file}: '@/ {include}' not found", "error")
     if args.dry_run:
         log("Dry-run mode: No files were written.", "warn")